@@ -14,16 +14,25 @@ NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
 NEO4J_CLIENT_ID = os.getenv("NEO4J_CLIENT_ID", "")
 NEO4J_CLIENT_SECRET = os.getenv("NEO4J_CLIENT_SECRET", "")
+NEO4J_STATEMENTS_PER_REQUEST = 20  # Cypher statements sent per transactional request when bulk loading
 
 # Qdrant Configuration
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_ANN_PROFILE = os.getenv("QDRANT_ANN_PROFILE", "balanced")  # fast | balanced | recall-max
 
 # RAG Configuration
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 COLLECTION_NAME = "hybrid_rag_collection"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+QDRANT_BATCH_SIZE = 128  # chunks embedded and upserted per request
+GRAPH_DOC_MAX_CHARS = 4096 * 4  # ~4096 tokens of text per LLM graph-extraction call
+GRAPH_MAX_TOTAL_CHARS = 50 * 3000  # document text per build_graph run: ~50 PDF pages, ~37k tokens
+
+# Query cache (retrieval results and generated answers)
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = 300  # seconds
 
 # Llama Cloud Configuration
 LLAMA_CLOUD_API_KEY = os.getenv("LLAMA_CLOUD_API_KEY")
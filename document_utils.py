@@ -17,18 +17,32 @@ def load_document(file_path: str) -> List[Document]:
             
             if LLAMA_CLOUD_API_KEY:
                 try:
+                    import asyncio
                     import nest_asyncio
-                    nest_asyncio.apply()
-                    from llama_parse import LlamaParse
-                    
-                    print("🦙 Using LlamaParse for PDF ingestion...")
-                    parser = LlamaParse(
-                        api_key=LLAMA_CLOUD_API_KEY,
-                        result_type="markdown",
-                        verbose=True,
-                        language="en",
-                    )
-                    llama_docs = parser.load_data(file_path)
+                    # Worker threads (parallel ingestion) have no event loop by default
+                    worker_loop = None
+                    try:
+                        asyncio.get_event_loop()
+                    except RuntimeError:
+                        worker_loop = asyncio.new_event_loop()
+                        asyncio.set_event_loop(worker_loop)
+                    try:
+                        nest_asyncio.apply()
+                        from llama_parse import LlamaParse
+                        
+                        print("🦙 Using LlamaParse for PDF ingestion...")
+                        parser = LlamaParse(
+                            api_key=LLAMA_CLOUD_API_KEY,
+                            result_type="markdown",
+                            verbose=True,
+                            language="en",
+                        )
+                        llama_docs = parser.load_data(file_path)
+                    finally:
+                        # Pool threads are reused; don't leave them holding a loop we opened
+                        if worker_loop is not None:
+                            asyncio.set_event_loop(None)
+                            worker_loop.close()
                     print(f"🦙 LlamaParse returned {len(llama_docs)} documents")
                     
                     # Only use LlamaParse results if we got documents
@@ -1,5 +1,5 @@
 import reflex as rx
-from .state import State
+from .state import State, warm_engine
 
 def login_page() -> rx.Component:
     """The login page."""
@@ -175,4 +175,5 @@ def index() -> rx.Component:
 
 # Create the app
 app = rx.App()
+app.register_lifespan_task(warm_engine)
 app.add_page(index)
@@ -1,6 +1,8 @@
 import reflex as rx
 import os
 import time
+import asyncio
+import threading
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -9,6 +11,25 @@ from rag_features import HybridRetriever
 from qdrant_connect import QdrantConnector
 from auth import authenticate
 
+# One RAG engine per backend process, shared by every session
+_engine: Optional[HybridRetriever] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> Optional[HybridRetriever]:
+    """Build (and warm up) the shared RAG engine on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            try:
+                _engine = HybridRetriever()
+            except Exception as e:
+                print(f"Error initializing RAG: {e}")
+        return _engine
+
+async def warm_engine():
+    """App lifespan task: build the engine at startup, off the event loop."""
+    await asyncio.to_thread(get_engine)
+
 class State(rx.State):
     """The app state."""
     
@@ -37,9 +58,6 @@ class State(rx.State):
     # --- Metrics State ---
     # (We could load metrics from CSV here if needed for dashboard)
     
-    # --- Internal Objects (not serialized) ---
-    _rag: Optional[HybridRetriever] = None
-
     # --- Explicit Setters (for Reflex 0.9 compatibility) ---
     def set_username_input(self, value: str): self.username_input = value
     def set_password_input(self, value: str): self.password_input = value
@@ -57,13 +75,8 @@ class State(rx.State):
         return self.user is not None
 
     def get_rag(self):
-        """Get or initialize the RAG engine."""
-        if self._rag is None:
-            try:
-                self._rag = HybridRetriever()
-            except Exception as e:
-                print(f"Error initializing RAG: {e}")
-        return self._rag
+        """Get the shared RAG engine (normally already built by `warm_engine`)."""
+        return get_engine()
 
     # --- Authentication Handlers ---
     
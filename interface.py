@@ -1,12 +1,17 @@
 import streamlit as st
 import os
-import shutil
 import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-import csv
+import queue
+import threading
 from datetime import datetime
 from rag_features import HybridRetriever
 from auth import require_auth, logout, init_session_state
+from metrics_log import (
+    METRICS_FILE, METRICS_RESET, ensure_metrics_file, load_metrics_agg, metrics_writer_loop
+)
 
 st.set_page_config(page_title="GreenPower RAG", page_icon="⚡", layout="wide")
 
@@ -21,16 +26,37 @@ st.title("⚡ GreenPower Hybrid RAG")
 st.markdown("Query your documents using Vector Search + Knowledge Graph.")
 
 # --- Metrics Setup ---
-METRICS_FILE = "metrics.csv"
-if not os.path.exists(METRICS_FILE):
-    with open(METRICS_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "latency", "route", "query_length", "response_length", "qdrant_latency", "neo4j_latency"])
+ensure_metrics_file()
 
-def log_metric(latency, route, query_len, response_len, qdrant_lat=0.0, neo4j_lat=0.0):
-    with open(METRICS_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([datetime.now().isoformat(), latency, route, query_len, response_len, qdrant_lat, neo4j_lat])
+@st.cache_resource
+def get_metrics_lock():
+    """Guards the CSV/aggregate pair against the writer thread and dashboard reruns."""
+    return threading.Lock()
+
+@st.cache_resource
+def get_metrics_queue():
+    """Start the background metrics writer once per server process."""
+    rows = queue.Queue()
+    threading.Thread(target=metrics_writer_loop, args=(rows, get_metrics_lock()), daemon=True).start()
+    return rows
+
+def log_metric(latency, route, query_len, response_len, qdrant_lat=None, neo4j_lat=None):
+    """Queue one metrics row; store latencies are left empty when they were not measured."""
+    get_metrics_queue().put_nowait([datetime.now().isoformat(), latency, route, query_len, response_len, qdrant_lat, neo4j_lat])
+
+METRICS_DTYPES = {
+    "latency": "float32",
+    "qdrant_latency": "float32",
+    "neo4j_latency": "float32",
+    "query_length": "int32",
+    "response_length": "int32",
+    "route": "category",
+}
+
+@st.cache_data(ttl=10)
+def load_metrics(path, mtime):
+    """Read the metrics CSV; `mtime` is only part of the cache key so edits invalidate it."""
+    return pd.read_csv(path, dtype=METRICS_DTYPES, parse_dates=["timestamp"])
 
 # --- RAG Engine ---
 @st.cache_resource
@@ -68,27 +94,26 @@ with st.sidebar:
     uploaded_files = st.file_uploader("Upload documents", accept_multiple_files=True, type=['pdf', 'txt', 'json', 'csv'])
     
     if st.button("Ingest Documents") and uploaded_files:
-        temp_dir = "temp_uploads"
-        os.makedirs(temp_dir, exist_ok=True)
-        paths = []
-        
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        for i, file in enumerate(uploaded_files):
-            path = os.path.join(temp_dir, file.name)
-            with open(path, "wb") as f:
-                f.write(file.getbuffer())
-            paths.append(path)
-        
-        status_text.text("Ingesting documents...")
-        result = rag.ingest(paths)
-        progress_bar.progress(100)
+        # Temporary directory is removed automatically, even if ingestion fails
+        with tempfile.TemporaryDirectory(prefix="temp_uploads_") as temp_dir:
+            def write_upload(file):
+                path = os.path.join(temp_dir, file.name)
+                with open(path, "wb") as f:
+                    f.write(file.getbuffer())
+                return path
+            
+            # Write all uploads concurrently; map() keeps the upload order
+            with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as pool:
+                paths = list(pool.map(write_upload, uploaded_files))
+            
+            status_text.text("Ingesting documents...")
+            result = rag.ingest(paths)
+            progress_bar.progress(100)
         
         st.json(result)
-        
-        # Cleanup
-        shutil.rmtree(temp_dir)
     
     st.divider()
     
@@ -150,9 +175,8 @@ with tab1:
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
+            start_time = time.time()
             with st.spinner("Thinking..."):
-                start_time = time.time()
-                
                 # Contextualize query using conversation history
                 contextualized_query = rag.contextualize_query(
                     prompt, 
@@ -160,41 +184,54 @@ with tab1:
                 )
                 
                 chunks, route, timings = rag.retrieve(contextualized_query)
-                response = rag.generate_answer(contextualized_query, chunks, route)
-                
-                end_time = time.time()
-                latency = end_time - start_time
-                
-                # Log metrics
-                log_metric(latency, route, len(prompt), len(response), timings.get("qdrant", 0), timings.get("neo4j", 0))
-                
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                with st.expander("Debug Details"):
-                    st.write(f"Route used: **{route}**")
-                    st.write(f"Latency: **{latency:.4f}s**")
-                    if contextualized_query != prompt:
-                        st.write(f"🔄 Contextualized query: *{contextualized_query}*")
-                    st.write("Context chunks:", chunks)
+            
+            # Render tokens as they arrive; remember when the first one showed up
+            stream_stats = {"first_token": None}
+            def stream_answer():
+                for piece in rag.generate_answer_stream(contextualized_query, chunks, route):
+                    if stream_stats["first_token"] is None:
+                        stream_stats["first_token"] = time.time()
+                    yield piece
+            
+            response = st.write_stream(stream_answer())
+            if not isinstance(response, str):
+                response = "".join(str(part) for part in response)
+            
+            end_time = time.time()
+            latency = end_time - start_time
+            ttft = (stream_stats["first_token"] or end_time) - start_time
+            
+            # Log metrics
+            log_metric(latency, route, len(prompt), len(response), timings.get("qdrant"), timings.get("neo4j"))
+            
+            st.session_state.messages.append({"role": "assistant", "content": response})
+            with st.expander("Debug Details"):
+                st.write(f"Route used: **{route}**")
+                st.write(f"Latency: **{latency:.4f}s** (first token after {ttft:.4f}s)")
+                if contextualized_query != prompt:
+                    st.write(f"🔄 Contextualized query: *{contextualized_query}*")
+                st.write("Context chunks:", chunks)
 
 with tab2:
     st.header("Dashboard Metrics")
     
     if os.path.exists(METRICS_FILE):
         try:
-            df = pd.read_csv(METRICS_FILE)
-            if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                
+            # Summary views come from the running totals; the full log is only read on demand
+            with get_metrics_lock():
+                agg = load_metrics_agg()
+            total = agg["n"]
+            if total:
                 # Top Level Metrics
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("Total Requests", len(df))
+                    st.metric("Total Requests", total)
                 with col2:
-                    avg_lat = df["latency"].mean()
+                    avg_lat = agg["sum_latency"] / total
                     st.metric("Avg Latency", f"{avg_lat:.2f} s")
                 with col3:
-                    req_per_min = len(df) / ((df['timestamp'].max() - df['timestamp'].min()).total_seconds() / 60) if len(df) > 1 else 0
+                    span_min = (datetime.fromisoformat(agg["t_max"]) - datetime.fromisoformat(agg["t_min"])).total_seconds() / 60
+                    req_per_min = total / span_min if total > 1 and span_min > 0 else 0
                     st.metric("Requests/Min", f"{req_per_min:.2f} rpm")
                 with col4:
                     success_rate = "100%" # Placeholder if we tracked errors
@@ -202,79 +239,74 @@ with tab2:
 
                 st.divider()
 
-                # Charts
-                col_chart1, col_chart2 = st.columns(2)
-                
-                with col_chart1:
-                    st.subheader("Latency over Time")
-                    # Simple line chart
-                    chart_data = df.set_index("timestamp")[["latency"]]
-                    st.line_chart(chart_data)
-                
-                with col_chart2:
-                    st.subheader("Requests Distribution by Route")
-                    route_counts = df["route"].value_counts()
-                    st.bar_chart(route_counts)
+                st.subheader("Requests Distribution by Route")
+                route_counts = pd.Series(agg["route_counts"])
+                st.bar_chart(route_counts)
 
                 st.divider()
                 st.subheader("Performance Comparison (Latency by Route)")
-                # Calculate average latency per route
-                if not df.empty:
-                    # Generic Route Comparison
-                    latency_by_route = df.groupby("route")["latency"].mean()
-                    st.bar_chart(latency_by_route)
-                    
-                    st.divider()
-                    st.subheader("Granular Latency: Qdrant vs Neo4j")
-                    st.info("Direct comparison of retrieval times (even within Hybrid requests)")
-                    
-                    # check if new columns exist (backward compatibility for old csv rows)
-                    if "qdrant_latency" in df.columns and "neo4j_latency" in df.columns:
-                        # Fill NaN with 0 for older logs
-                        df["qdrant_latency"] = df["qdrant_latency"].fillna(0)
-                        df["neo4j_latency"] = df["neo4j_latency"].fillna(0)
-                        
-                        avg_qdrant = df["qdrant_latency"].mean()
-                        avg_neo4j = df["neo4j_latency"].mean()
-                        
-                        # Side by side metrics
-                        m1, m2 = st.columns(2)
-                        m1.metric("Avg Qdrant Retrieval", f"{avg_qdrant:.4f} s")
-                        m2.metric("Avg Neo4j Retrieval", f"{avg_neo4j:.4f} s")
-                        
-                        # Bar chart comparison
-                        comp_data = pd.DataFrame({
-                            "Source": ["Qdrant", "Neo4j"],
-                            "Avg Latency (s)": [avg_qdrant, avg_neo4j]
-                        }).set_index("Source")
-                        st.bar_chart(comp_data)
-                    
-                    # Optional: Textual comparison
-                    cols = st.columns(len(latency_by_route))
-                    for i, (route_name, avg_val) in enumerate(latency_by_route.items()):
-                        cols[i].metric(f"{route_name.title()} Avg", f"{avg_val:.4f} s")
+                # Average latency per route
+                latency_by_route = pd.Series({
+                    route_name: agg["route_sum_latency"][route_name] / count
+                    for route_name, count in agg["route_counts"].items()
+                })
+                st.bar_chart(latency_by_route)
+                
+                st.divider()
+                st.subheader("Granular Latency: Qdrant vs Neo4j")
+                st.info("Direct comparison of retrieval times (even within Hybrid requests)")
+                
+                timed = agg["n_timed"]
+                avg_qdrant = agg["sum_qdrant"] / timed if timed else 0.0
+                avg_neo4j = agg["sum_neo4j"] / timed if timed else 0.0
+                
+                # Side by side metrics
+                m1, m2 = st.columns(2)
+                m1.metric("Avg Qdrant Retrieval", f"{avg_qdrant:.4f} s")
+                m2.metric("Avg Neo4j Retrieval", f"{avg_neo4j:.4f} s")
+                
+                # Bar chart comparison
+                comp_data = pd.DataFrame({
+                    "Source": ["Qdrant", "Neo4j"],
+                    "Avg Latency (s)": [avg_qdrant, avg_neo4j]
+                }).set_index("Source")
+                st.bar_chart(comp_data)
+                
+                # Optional: Textual comparison
+                cols = st.columns(len(latency_by_route))
+                for i, (route_name, avg_val) in enumerate(latency_by_route.items()):
+                    cols[i].metric(f"{route_name.title()} Avg", f"{avg_val:.4f} s")
 
                 # Advanced Layout for Analysis
                 st.subheader("Detailed Analysis")
                 
-                # Latency vs Query Length Scatter (Do queries get slower if they are longer?)
-                # Streamlit scatter needs a bit more work or using altair/plotly, stick to simple Vega-Lite via st.scatter_chart if available in newer versions, else altair.
-                # using st.scatter_chart (available in recent streamlit)
-                try:
-                    st.scatter_chart(df, x="query_length", y="latency", color="route")
-                except:
-                    st.info("Scatter chart requires newer streamlit version.")
+                if st.checkbox("Load full request log (latency over time, scatter, raw logs)"):
+                    df = load_metrics(METRICS_FILE, os.path.getmtime(METRICS_FILE))
+                    
+                    st.subheader("Latency over Time")
+                    # Simple line chart
+                    chart_data = df.set_index("timestamp")[["latency"]]
+                    st.line_chart(chart_data)
+                    
+                    # Latency vs Query Length Scatter (Do queries get slower if they are longer?)
+                    # using st.scatter_chart (available in recent streamlit)
+                    try:
+                        st.scatter_chart(df, x="query_length", y="latency", color="route")
+                    except:
+                        st.info("Scatter chart requires newer streamlit version.")
 
-                with st.expander("View Raw Logs"):
-                    st.dataframe(df.sort_values("timestamp", ascending=False), use_container_width=True)
+                    with st.expander("View Raw Logs"):
+                        st.dataframe(df.sort_values("timestamp", ascending=False), use_container_width=True)
             else:
                 st.info("No data available yet. Make a request in the Chat tab!")
         except Exception as e:
             st.error(f"Error loading metrics: {e}")
             # If CSV is corrupted
             if st.button("Reset Metrics File"):
-                if os.path.exists(METRICS_FILE):
-                    os.remove(METRICS_FILE)
-                    st.experimental_rerun()
+                # The writer thread holds the file open, so let it do the reset
+                done = threading.Event()
+                get_metrics_queue().put_nowait((METRICS_RESET, done))
+                done.wait(timeout=10)
+                st.experimental_rerun()
     else:
         st.warning("Metrics file not found. It will be created on the first request.")
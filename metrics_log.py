@@ -0,0 +1,175 @@
+"""Request metrics log: CSV rows plus a JSON sidecar of running totals."""
+import os
+import csv
+import json
+import queue
+from datetime import datetime
+
+METRICS_FILE = "metrics.csv"
+METRICS_HEADER = ["timestamp", "latency", "route", "query_length", "response_length", "qdrant_latency", "neo4j_latency"]
+
+METRICS_AGG_FILE = "metrics_agg.json"
+
+# Queue message asking the writer to wipe the log: (METRICS_RESET, threading.Event)
+METRICS_RESET = "reset"
+
+def empty_metrics_agg():
+    return {
+        "n": 0,
+        "sum_latency": 0.0,
+        "n_timed": 0,
+        "sum_qdrant": 0.0,
+        "sum_neo4j": 0.0,
+        "route_counts": {},
+        "route_sum_latency": {},
+        "t_min": None,
+        "t_max": None,
+    }
+
+def update_metrics_agg(agg, rows):
+    """Fold metric rows (in METRICS_HEADER order) into the running totals."""
+    for timestamp, latency, route, _query_len, _response_len, qdrant_lat, neo4j_lat in rows:
+        timestamp = datetime.fromisoformat(timestamp)
+        latency = float(latency)
+        # Cached retrievals log no store timings; keep them out of the store averages
+        timed = qdrant_lat not in (None, "")
+        if timed:
+            qdrant_lat, neo4j_lat = float(qdrant_lat), float(neo4j_lat or 0)
+        agg["n"] += 1
+        agg["sum_latency"] += latency
+        if timed:
+            agg["n_timed"] += 1
+            agg["sum_qdrant"] += qdrant_lat
+            agg["sum_neo4j"] += neo4j_lat
+        agg["route_counts"][route] = agg["route_counts"].get(route, 0) + 1
+        agg["route_sum_latency"][route] = agg["route_sum_latency"].get(route, 0.0) + latency
+        if agg["t_min"] is None or timestamp < datetime.fromisoformat(agg["t_min"]):
+            agg["t_min"] = timestamp.isoformat()
+        if agg["t_max"] is None or timestamp > datetime.fromisoformat(agg["t_max"]):
+            agg["t_max"] = timestamp.isoformat()
+    return agg
+
+def save_metrics_agg(agg):
+    tmp_path = METRICS_AGG_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(agg, f)
+    os.replace(tmp_path, METRICS_AGG_FILE)
+
+def load_metrics_agg(rebuild=False):
+    """Read the running totals, rebuilding them from the CSV if the sidecar is missing (or `rebuild`)."""
+    if not rebuild:
+        try:
+            with open(METRICS_AGG_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    agg = empty_metrics_agg()
+    if os.path.exists(METRICS_FILE):
+        with open(METRICS_FILE, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # header
+            for row in reader:
+                if len(row) != len(METRICS_HEADER):
+                    continue
+                try:
+                    update_metrics_agg(agg, [row])
+                except ValueError:
+                    # Malformed row; rows are parsed before any total is touched
+                    continue
+    save_metrics_agg(agg)
+    return agg
+
+def _is_current_file(f):
+    """True if the open handle still refers to the metrics file on disk."""
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(METRICS_FILE).st_ino
+    except OSError:
+        return False
+
+def metrics_writer_loop(rows, lock):
+    """Drain queued metric rows into the CSV through one long-lived file handle.
+
+    The writer owns the CSV and its sidecar: resets are queued to it instead of
+    deleting files it may hold open.
+    """
+    f = None
+    agg = None
+    
+    def close_file():
+        nonlocal f
+        if f:
+            try:
+                f.close()
+            except OSError:
+                pass
+        f = None
+    
+    def write_rows(batch):
+        nonlocal f, agg
+        # (Re)open if the file was replaced or removed behind our back
+        if f is None or not _is_current_file(f):
+            # A replaced file invalidates the sidecar too, so recount from the CSV
+            stale = f is not None
+            close_file()
+            is_new = not os.path.exists(METRICS_FILE) or os.path.getsize(METRICS_FILE) == 0
+            f = open(METRICS_FILE, "a", newline="", encoding="utf-8")
+            if is_new:
+                csv.writer(f).writerow(METRICS_HEADER)
+                f.flush()
+            if stale or is_new:
+                agg = load_metrics_agg(rebuild=True)
+        if agg is None:
+            agg = load_metrics_agg()
+        csv.writer(f).writerows(batch)
+        f.flush()
+        save_metrics_agg(update_metrics_agg(agg, batch))
+    
+    def reset():
+        nonlocal f, agg
+        close_file()
+        with open(METRICS_FILE, "w", newline="", encoding="utf-8") as new_file:
+            csv.writer(new_file).writerow(METRICS_HEADER)
+        agg = empty_metrics_agg()
+        save_metrics_agg(agg)
+    
+    while True:
+        items = [rows.get()]
+        while True:
+            try:
+                items.append(rows.get_nowait())
+            except queue.Empty:
+                break
+        
+        # Write consecutive rows together; handle resets in queue order
+        pending = []
+        for item in items + [None]:
+            if isinstance(item, list):
+                pending.append(item)
+                continue
+            with lock:
+                try:
+                    if pending:
+                        write_rows(pending)
+                except Exception as e:
+                    # Keep the writer alive; start from a fresh handle and totals next time
+                    print(f"⚠️ Failed to write {len(pending)} metric row(s): {e}")
+                    close_file()
+                    agg = None
+                pending = []
+                if item is not None:
+                    _, done = item
+                    try:
+                        reset()
+                    except Exception as e:
+                        print(f"⚠️ Failed to reset metrics: {e}")
+                        close_file()
+                        agg = None
+                    finally:
+                        done.set()
+
+def ensure_metrics_file():
+    """Create the metrics CSV with its header if it does not exist yet."""
+    if not os.path.exists(METRICS_FILE):
+        with open(METRICS_FILE, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(METRICS_HEADER)
@@ -1,13 +1,59 @@
 import os
 import re
 import json
+import functools
+import itertools
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from typing import List, Dict, Any, Optional
+from urllib3.util.retry import Retry
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
-from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config import NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, NEO4J_STATEMENTS_PER_REQUEST, GRAPH_DOC_MAX_CHARS, GRAPH_MAX_TOTAL_CHARS
+
+# Only words of 3+ characters can be keywords, so shorter ones are skipped inside the regex engine
+_WORD_RE = re.compile(r'\b\w{3,}\b')
+_STOP_WORDS = frozenset({'the', 'a', 'an', 'is', 'are', 'was', 'who', 'what', 'where', 'when', 'why', 'how', 'which', 'that', 'this', 'in', 'on', 'at', 'to', 'for', 'of', 'and', 'or', 'with', 'from', 'by'})
+
+@functools.lru_cache(maxsize=1024)
+def _extract_keywords_impl(text: str) -> Tuple[str, ...]:
+    words = _WORD_RE.findall(text.lower())
+    keywords = [w for w in words if w not in _STOP_WORDS]
+    # Order-preserving dedup
+    return tuple(dict.fromkeys(keywords))[:10]
+
+def _quote_name(name: str) -> str:
+    """Backtick-quote a label or relationship type for safe use in Cypher."""
+    return "`" + name.replace("`", "``") + "`"
+
+def _graph_batches(documents: List[Document], max_chars: int = GRAPH_DOC_MAX_CHARS) -> List[Document]:
+    """Cut raw documents into LLM-sized pieces of at most `max_chars`.
+
+    Oversized documents are split without overlap, then adjacent pieces of the
+    same source (e.g. PDF pages) are merged, so no text is sent twice.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=max_chars, chunk_overlap=0)
+    merged = []
+    parts, size, source, metadata = [], 0, None, {}
+    for doc in splitter.split_documents(documents):
+        doc_source = doc.metadata.get("source")
+        text = doc.page_content
+        # len(parts) counts the "\n" joiners the merged piece will gain
+        if parts and (doc_source != source or size + len(parts) + len(text) > max_chars):
+            merged.append(Document(page_content="\n".join(parts), metadata=metadata))
+            parts, size = [], 0
+        if not parts:
+            source, metadata = doc_source, dict(doc.metadata)
+        parts.append(text)
+        size += len(text)
+    if parts:
+        merged.append(Document(page_content="\n".join(parts), metadata=metadata))
+    return merged
 
 class Neo4jConnection:
     """Manages Neo4j database connection and operations."""
@@ -16,6 +62,7 @@ class Neo4jConnection:
         self.driver = None
         self.use_http_api = False
         self.http_base_url = None
+        self.session = None
         self._connect()
     
     def _connect(self):
@@ -41,13 +88,23 @@ class Neo4jConnection:
             http_url = NEO4J_URI.replace("neo4j+s://", "https://").replace("neo4j://", "http://")
             self.http_base_url = http_url
             
+            # Reuse one keep-alive session for every HTTP query
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=16,
+                pool_maxsize=64,
+                max_retries=Retry(total=3, backoff_factor=0.1)
+            )
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.session.auth = HTTPBasicAuth(NEO4J_USER, NEO4J_PASSWORD)
+            self.session.headers.update({"Content-Type": "application/json"})
+            
             # Test HTTP API connectivity
             query_url = f"{http_url}/db/neo4j/query/v2"
-            resp = requests.post(
+            resp = self.session.post(
                 query_url,
-                headers={"Content-Type": "application/json"},
-                json={"statement": "RETURN 1 as test"},
-                auth=HTTPBasicAuth(NEO4J_USER, NEO4J_PASSWORD),
+                data=orjson.dumps({"statement": "RETURN 1 as test"}),
                 timeout=30
             )
             
@@ -65,10 +122,28 @@ class Neo4jConnection:
         """Close the database connection."""
         if self.driver:
             self.driver.close()
+        if self.session:
+            self.session.close()
     
     def is_connected(self) -> bool:
         return self.driver is not None or self.use_http_api
     
+    def _post(self, path: str, payload: Dict) -> Dict:
+        """POST a JSON payload to the HTTP API and return the decoded response."""
+        resp = self.session.post(f"{self.http_base_url}{path}", data=orjson.dumps(payload), timeout=30)
+        if resp.status_code not in [200, 201, 202]:
+            raise RuntimeError(f"HTTP API error: {resp.status_code} - {resp.text[:200]}")
+        return orjson.loads(resp.content)
+    
+    def _post_query(self, query: str, parameters: Dict = None) -> Tuple[List[str], List[list]]:
+        """Run one statement through the HTTP query API and return (columns, rows)."""
+        data = self._post("/db/neo4j/query/v2", {
+            "statement": query,
+            "parameters": parameters or {}
+        })
+        body = data.get("data") or {}
+        return body.get("fields", []), body.get("values", [])
+    
     def execute_query(self, query: str, parameters: Dict = None) -> List[Dict]:
         """Execute a Cypher query and return results."""
         if self.driver:
@@ -84,39 +159,95 @@ class Neo4jConnection:
         elif self.use_http_api and self.http_base_url:
             # Use HTTP API
             try:
-                query_url = f"{self.http_base_url}/db/neo4j/query/v2"
-                
-                # Use HTTP API with parameters
-                payload = {
-                    "statement": query,
-                    "parameters": parameters or {}
-                }
-                
-                resp = requests.post(
-                    query_url,
-                    headers={"Content-Type": "application/json"},
-                    json=payload,
-                    auth=HTTPBasicAuth(NEO4J_USER, NEO4J_PASSWORD),
-                    timeout=30
-                )
-                
-                if resp.status_code in [200, 202]:
-                    data = resp.json()
-                    # Parse the response format
-                    if "data" in data and "values" in data["data"]:
-                        columns = data["data"].get("fields", [])
-                        rows = data["data"].get("values", [])
-                        return [dict(zip(columns, row)) for row in rows]
-                    return []
-                else:
-                    print(f"HTTP API error: {resp.status_code} - {resp.text[:200]}")
-                    return []
+                columns, rows = self._post_query(query, parameters)
+                return [dict(zip(columns, row)) for row in rows]
             except Exception as e:
                 print(f"Query error (HTTP): {e}")
                 return []
         
         return []
     
+    def execute_query_columnar(self, query: str, parameters: Dict = None) -> Dict[str, list]:
+        """Execute a Cypher query and return results as one list per column.
+
+        Avoids building a dict per row, which matters for large result sets.
+        Over Bolt, nodes and relationships come back as driver objects, so
+        queries should return maps (e.g. `properties(n)`) where dicts are needed.
+        """
+        if self.driver:
+            try:
+                with self.driver.session() as session:
+                    result = session.run(query, parameters or {})
+                    columns = list(result.keys())
+                    rows = [record.values() for record in result]
+            except Exception as e:
+                print(f"Query error (Bolt): {e}")
+                return {}
+        
+        elif self.use_http_api and self.http_base_url:
+            try:
+                columns, rows = self._post_query(query, parameters)
+            except Exception as e:
+                print(f"Query error (HTTP): {e}")
+                return {}
+        
+        else:
+            return {}
+        
+        return {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+    
+    def execute_many(self, statements: List[Tuple[str, Dict]]) -> List[List[Dict]]:
+        """Execute several Cypher statements in one transaction.
+
+        Over HTTP, all statements are sent in a single POST to the transactional
+        endpoint. Returns one result list per statement.
+        """
+        if not statements:
+            return []
+        
+        if self.driver:
+            try:
+                with self.driver.session() as session:
+                    with session.begin_transaction() as tx:
+                        results = [
+                            [record.data() for record in tx.run(query, parameters or {})]
+                            for query, parameters in statements
+                        ]
+                        tx.commit()
+                        return results
+            except Exception as e:
+                print(f"Batch query error (Bolt): {e}")
+                return [[] for _ in statements]
+        
+        elif self.use_http_api and self.http_base_url:
+            try:
+                data = self._post("/db/neo4j/tx/commit", {
+                    "statements": [
+                        {"statement": query, "parameters": parameters or {}, "includeStats": False}
+                        for query, parameters in statements
+                    ]
+                })
+                if data.get("errors"):
+                    print(f"HTTP API batch error: {data['errors'][0]}")
+                    return [[] for _ in statements]
+                results = []
+                for result in data.get("results", []):
+                    columns = result.get("columns", [])
+                    results.append([dict(zip(columns, row["row"])) for row in result.get("data", [])])
+                return results
+            except Exception as e:
+                print(f"Batch query error (HTTP): {e}")
+                return [[] for _ in statements]
+        
+        return [[] for _ in statements]
+    
+    def execute_in_batches(self, statements: List[Tuple[str, Dict]], batch_size: int = NEO4J_STATEMENTS_PER_REQUEST) -> List[List[Dict]]:
+        """Run statements through `execute_many`, `batch_size` statements per request."""
+        results = []
+        for i in range(0, len(statements), batch_size):
+            results.extend(self.execute_many(statements[i:i + batch_size]))
+        return results
+    
     def create_node(self, label: str, properties: Dict) -> Optional[int]:
         """Create a node with given label and properties."""
         query = f"CREATE (n:{label} $props) RETURN id(n) as node_id"
@@ -126,13 +257,89 @@ class Neo4jConnection:
     def create_relationship(self, from_id: int, to_id: int, rel_type: str, properties: Dict = None):
         """Create a relationship between two nodes."""
         query = """
-        MATCH (a), (b)
-        WHERE id(a) = $from_id AND id(b) = $to_id
+        MATCH (a) WHERE id(a) = $from_id
+        WITH a
+        MATCH (b) WHERE id(b) = $to_id
         CREATE (a)-[r:%s $props]->(b)
         RETURN type(r) as rel_type
         """ % rel_type
         return self.execute_query(query, {"from_id": from_id, "to_id": to_id, "props": properties or {}})
     
+    def _nodes_batch_statement(self, label: str, rows: List[Dict]) -> Tuple[str, Dict]:
+        query = f"""
+        UNWIND $rows AS r
+        CREATE (n:{_quote_name(label)} {{name: r.name, source: r.source}})
+        RETURN r.name AS name, id(n) AS nid
+        """
+        return query, {"rows": rows}
+    
+    def _relationships_batch_statement(self, rel_type: str, pairs: List[Dict]) -> Tuple[str, Dict]:
+        query = f"""
+        UNWIND $pairs AS p
+        MATCH (a) WHERE id(a) = p.f
+        WITH a, p
+        MATCH (b) WHERE id(b) = p.t
+        CREATE (a)-[r:{_quote_name(rel_type)}]->(b)
+        RETURN count(r) AS created
+        """
+        return query, {"pairs": pairs}
+    
+    def create_nodes_batch(self, label: str, rows: List[Dict]) -> Dict[str, int]:
+        """Create many nodes of one label in a single round-trip.
+
+        Returns a mapping of node name to its internal id.
+        """
+        if not rows:
+            return {}
+        result = self.execute_query(*self._nodes_batch_statement(label, rows))
+        return {record["name"]: record["nid"] for record in result}
+    
+    def create_relationships_batch(self, rel_type: str, pairs: List[Dict]) -> int:
+        """Create many relationships of one type in a single round-trip.
+
+        Each pair is a dict with the internal ids of both ends: {"f": from_id, "t": to_id}.
+        """
+        if not pairs:
+            return 0
+        result = self.execute_query(*self._relationships_batch_statement(rel_type, pairs))
+        return result[0]["created"] if result else 0
+    
+    def ingest_bulk(self, nodes_by_label: Dict[str, List[Dict]]) -> Dict[str, int]:
+        """Create node batches for every label, several labels per request.
+
+        Returns a mapping of node name to its internal id.
+        """
+        statements = [
+            self._nodes_batch_statement(label, rows)
+            for label, rows in nodes_by_label.items() if rows
+        ]
+        return {
+            record["name"]: record["nid"]
+            for result in self.execute_in_batches(statements)
+            for record in result
+        }
+    
+    def create_relationships_bulk(self, pairs_by_type: Dict[str, List[Dict]]) -> int:
+        """Create relationship batches for every type, several types per request."""
+        statements = [
+            self._relationships_batch_statement(rel_type, pairs)
+            for rel_type, pairs in pairs_by_type.items() if pairs
+        ]
+        return sum(
+            result[0]["created"]
+            for result in self.execute_in_batches(statements) if result
+        )
+    
+    def ensure_name_indexes(self, labels: List[str]):
+        """Create a range index on `name` for each label (no-op if it already exists).
+
+        Indexes are left for Neo4j to name, so every label gets its own index.
+        """
+        for label in labels:
+            self.execute_query(
+                f"CREATE INDEX IF NOT EXISTS FOR (n:{_quote_name(label)}) ON (n.name)"
+            )
+    
     def search_nodes(self, keyword: str, limit: int = 10) -> List[Dict]:
         """Search nodes by keyword in their properties."""
         query = """
@@ -143,6 +350,28 @@ class Neo4jConnection:
         """
         return self.execute_query(query, {"keyword": keyword, "limit": limit})
     
+    def search_graph(self, keywords: List[str], node_cap: int = 50, rels_per_node: int = 5) -> Dict[str, list]:
+        """Find nodes matching any keyword plus their 1-hop relationships in one round-trip.
+
+        Returns columns `node_id`, `labels`, `props` and `rels`.
+        """
+        if not keywords:
+            return {}
+        query = """
+        UNWIND $keywords AS kw
+        MATCH (n)
+        WHERE any(key IN keys(n) WHERE toString(n[key]) CONTAINS kw)
+        WITH DISTINCT n LIMIT $node_cap
+        OPTIONAL MATCH (n)-[r]-()
+        WITH n, collect(CASE WHEN r IS NULL THEN NULL ELSE {type: type(r), props: properties(r)} END) AS rels
+        RETURN id(n) AS node_id, labels(n) AS labels, properties(n) AS props, rels[..$rels_per_node] AS rels
+        """
+        return self.execute_query_columnar(query, {
+            "keywords": keywords,
+            "node_cap": node_cap,
+            "rels_per_node": rels_per_node
+        })
+    
     def get_node_relationships(self, node_id: int, depth: int = 2) -> List[Dict]:
         """Get all relationships for a node up to specified depth."""
         query = """
@@ -158,12 +387,19 @@ class Neo4jConnection:
 class GraphRAG:
     """Graph-based RAG using Neo4j for knowledge graph storage and retrieval."""
     
+    # Maximum number of lines of graph context passed to the LLM
+    CONTEXT_LINES = 20
+    
     def __init__(self, llm=None):
         self.neo4j = Neo4jConnection()
         self.llm = llm
         
         if not self.neo4j.is_connected():
             print("⚠️ Neo4j not connected. GraphRAG will be disabled.")
+        else:
+            # Index the `name` property of every existing label
+            labels = [r.get("label") for r in self.neo4j.execute_query("CALL db.labels() YIELD label RETURN label")]
+            self.neo4j.ensure_name_indexes([l for l in labels if l])
     
     def is_available(self) -> bool:
         return self.neo4j.is_connected()
@@ -183,9 +419,19 @@ class GraphRAG:
         print("🧠 Transforming documents to graph structure with LLM...")
         llm_transformer = LLMGraphTransformer(llm=self.llm)
         
-        # Convert documents to graph documents
-        # Note: We process limited chunks to avoid context limits
-        graph_documents = llm_transformer.convert_to_graph_documents(documents[:50])
+        # Pack documents per source up to the LLM budget
+        # Note: We process limited text (and at most 50 calls) to bound LLM cost
+        batches, budget = [], GRAPH_MAX_TOTAL_CHARS
+        for batch in _graph_batches(documents)[:50]:
+            budget -= len(batch.page_content)
+            if budget < 0:
+                break
+            batches.append(batch)
+        
+        # Convert documents to graph documents, several LLM calls in flight at once
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = pool.map(lambda doc: llm_transformer.convert_to_graph_documents([doc]), batches)
+            graph_documents = [graph_doc for result in results for graph_doc in result]
         
         total_entities = 0
         total_relations = 0
@@ -193,36 +439,43 @@ class GraphRAG:
         
         print(f"🕸️ Inserting {len(graph_documents)} graph documents into Neo4j...")
         
+        # 1. Group unique nodes by label so each label is a single UNWIND statement
+        nodes_by_label = {}
+        seen_names = set()
         for graph_doc in graph_documents:
-            # 1. Insert Nodes
+            source = graph_doc.source.metadata.get("source", "unknown")
             for node in graph_doc.nodes:
                 entity_name = node.id
-                if entity_name.lower() not in entity_id_map:
-                    node_id = self.neo4j.create_node(
-                        label=node.type,
-                        properties={
-                            "name": entity_name,
-                            "source": graph_doc.source.metadata.get("source", "unknown")
-                        }
-                    )
-                    if node_id is not None:
-                        entity_id_map[entity_name.lower()] = node_id
-                        total_entities += 1
-            
-            # 2. Insert Relationships
+                if entity_name.lower() in seen_names:
+                    continue
+                seen_names.add(entity_name.lower())
+                nodes_by_label.setdefault(node.type, []).append({
+                    "name": entity_name,
+                    "source": source
+                })
+        
+        self.neo4j.ensure_name_indexes(list(nodes_by_label))
+        
+        for name, node_id in self.neo4j.ingest_bulk(nodes_by_label).items():
+            if node_id is not None:
+                entity_id_map[name.lower()] = node_id
+                total_entities += 1
+        
+        # 2. Group relationships by type so each type is a single UNWIND statement
+        pairs_by_type = {}
+        for graph_doc in graph_documents:
             for rel in graph_doc.relationships:
                 from_name = rel.source.id.lower()
                 to_name = rel.target.id.lower()
                 rel_type = rel.type.replace(" ", "_").upper()
                 
                 if from_name in entity_id_map and to_name in entity_id_map:
-                    self.neo4j.create_relationship(
-                        from_id=entity_id_map[from_name],
-                        to_id=entity_id_map[to_name],
-                        rel_type=rel_type,
-                        properties={} # LLMGraphTransformer relations usually don't have extra props by default
-                    )
-                    total_relations += 1
+                    pairs_by_type.setdefault(rel_type, []).append({
+                        "f": entity_id_map[from_name],
+                        "t": entity_id_map[to_name]
+                    })
+        
+        total_relations += self.neo4j.create_relationships_bulk(pairs_by_type)
                     
         return {"entities": total_entities, "relations": total_relations}
     
@@ -232,41 +485,35 @@ class GraphRAG:
             return ""
         
         keywords = self._extract_keywords(question)
-        graph_context = []
-        seen_nodes = set()
         
-        for keyword in keywords:
-            nodes = self.neo4j.search_nodes(keyword, limit=5)
-            for node_data in nodes:
-                node_id = node_data.get("node_id")
-                if node_id in seen_nodes: continue
-                seen_nodes.add(node_id)
-                
-                node_props = node_data.get("n", {})
-                labels = node_data.get("labels", [])
-                
-                node_info = f"[{'/'.join(labels)}] {node_props.get('name', 'Unknown')}"
-                if node_props.get("description"):
-                    node_info += f": {node_props.get('description')}"
-                graph_context.append(node_info)
-                
-                relationships = self.neo4j.get_node_relationships(node_id, depth=1)
-                for rel_data in relationships[:5]:
-                    for rel in rel_data.get("relationships", []):
-                        rel_info = f"  -> {rel.get('type', 'RELATED')}"
-                        if rel.get("props", {}).get("description"):
-                            rel_info += f": {rel['props']['description']}"
-                        graph_context.append(rel_info)
+        # Single round-trip: matching nodes for all keywords plus their relationships.
+        # Each node yields at least one line, so more nodes than lines are never needed.
+        nodes = self.neo4j.search_graph(keywords, node_cap=self.CONTEXT_LINES)
+        graph_context = list(itertools.islice(self._format_graph_context(nodes), self.CONTEXT_LINES))
         
         if graph_context:
-            return "Knowledge Graph Context:\n" + "\n".join(graph_context[:20])
+            return "Knowledge Graph Context:\n" + "\n".join(graph_context)
         return ""
     
+    def _format_graph_context(self, nodes: Dict[str, list]):
+        """Lazily yield one context line per node and per relationship."""
+        props_col = nodes.get("props", [])
+        labels_col = nodes.get("labels", [])
+        rels_col = nodes.get("rels", [])
+        for i in range(len(nodes.get("node_id", []))):
+            node_props = props_col[i] or {}
+            labels = labels_col[i] or []
+            
+            node_info = f"[{'/'.join(labels)}] {node_props.get('name', 'Unknown')}"
+            if node_props.get("description"):
+                node_info += f": {node_props.get('description')}"
+            yield node_info
+            
+            for rel in rels_col[i] or []:
+                rel_info = f"  -> {rel.get('type', 'RELATED')}"
+                if (rel.get("props") or {}).get("description"):
+                    rel_info += f": {rel['props']['description']}"
+                yield rel_info
+    
     def _extract_keywords(self, text: str) -> List[str]:
-        stop_words = {'the', 'a', 'an', 'is', 'are', 'was', 'who', 'what', 'where', 'when', 'why', 'how', 'which', 'that', 'this', 'in', 'on', 'at', 'to', 'for', 'of', 'and', 'or', 'with', 'from', 'by'}
-        words = re.findall(r'\b\w+\b', text.lower())
-        keywords = [w for w in words if w not in stop_words and len(w) > 2]
-        unique_keywords = []
-        for kw in keywords:
-            if kw not in unique_keywords: unique_keywords.append(kw)
-        return unique_keywords[:10]
+        return list(_extract_keywords_impl(text))
@@ -1,15 +1,31 @@
 import os
+from typing import List
+from langchain_core.documents import Document
 from langchain_qdrant import QdrantVectorStore
 from langchain_huggingface import HuggingFaceEmbeddings
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
-from config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, EMBEDDING_MODEL
+from qdrant_client.http.models import (
+    Distance, VectorParams, QueryRequest, HnswConfigDiff, SearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, QuantizationSearchParams
+)
+from config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, EMBEDDING_MODEL, QDRANT_BATCH_SIZE, QDRANT_ANN_PROFILE
+
+# HNSW build/search effort and rescoring oversampling per speed/recall trade-off
+ANN_PROFILES = {
+    "fast": {"ef_construct": 64, "hnsw_ef": 32, "oversampling": 1.5},
+    "balanced": {"ef_construct": 100, "hnsw_ef": 64, "oversampling": 2.0},
+    "recall-max": {"ef_construct": 256, "hnsw_ef": 256, "oversampling": 3.0},
+}
 
 class QdrantConnector:
     """Manages interactions with Qdrant vector database."""
     
     def __init__(self):
+        if QDRANT_ANN_PROFILE not in ANN_PROFILES:
+            print(f"⚠️ Unknown QDRANT_ANN_PROFILE '{QDRANT_ANN_PROFILE}', using 'balanced'.")
+        self.profile = ANN_PROFILES.get(QDRANT_ANN_PROFILE, ANN_PROFILES["balanced"])
         self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+        self.is_cloud = False
         self.client = self._connect()
         self.vector_store = self._init_vector_store()
         
@@ -39,6 +55,7 @@ class QdrantConnector:
                 # Test connection by getting collection info
                 info = client.get_collection(COLLECTION_NAME)
                 print(f"✅ Connected to Qdrant Cloud (collection: {COLLECTION_NAME}, {info.points_count} points)")
+                self.is_cloud = True
                 return client
             except Exception as e:
                 print(f"⚠️ Failed to connect to Qdrant Cloud ({e}). Falling back to local memory.")
@@ -46,13 +63,46 @@ class QdrantConnector:
         print("📦 Using local Qdrant (in-memory).")
         return QdrantClient(location=":memory:")
     
+    def _quantization_config(self) -> ScalarQuantization:
+        # INT8 vectors kept in RAM; full vectors are only read for rescoring
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=0.99,
+                always_ram=True
+            )
+        )
+    
+    def _apply_index_settings(self):
+        """Bring an existing collection in line with the INT8 / HNSW profile settings."""
+        try:
+            config = self.client.get_collection(COLLECTION_NAME).config
+            quantization = self._quantization_config()
+            ef_construct = self.profile["ef_construct"]
+            if config.quantization_config == quantization and config.hnsw_config.ef_construct == ef_construct:
+                return
+            self.client.update_collection(
+                collection_name=COLLECTION_NAME,
+                quantization_config=quantization,
+                hnsw_config=HnswConfigDiff(ef_construct=ef_construct),
+            )
+            print(f"⚙️ Applied INT8 quantization and ef_construct={ef_construct} to {COLLECTION_NAME}")
+        except Exception as e:
+            print(f"⚠️ Could not update index settings of {COLLECTION_NAME}: {e}")
+    
     def _init_vector_store(self) -> QdrantVectorStore:
         """Initialize the vector store."""
         if not self.client.collection_exists(COLLECTION_NAME):
             self.client.create_collection(
                 collection_name=COLLECTION_NAME,
                 vectors_config=VectorParams(size=384, distance=Distance.COSINE),
+                hnsw_config=HnswConfigDiff(ef_construct=self.profile["ef_construct"]),
+                quantization_config=self._quantization_config(),
             )
+        elif self.is_cloud:
+            # Cloud collections always pre-exist; the local in-memory client is brute force
+            # and ignores these settings anyway
+            self._apply_index_settings()
             
         return QdrantVectorStore(
             client=self.client,
@@ -60,13 +110,60 @@ class QdrantConnector:
             embedding=self.embeddings,
         )
 
-    def index_documents(self, documents):
-        """Index documents into Qdrant."""
+    def warmup(self):
+        """Run one throwaway embedding so the model is fully loaded before the first query."""
+        try:
+            self.embeddings.embed_query("warmup")
+        except Exception as e:
+            print(f"⚠️ Embedder warmup failed: {e}")
+
+    def index_documents(self, documents, batch_size: int = QDRANT_BATCH_SIZE):
+        """Index documents into Qdrant.
+
+        Chunks are embedded and upserted `batch_size` at a time; every batch
+        waits for the server so a failed upsert raises here instead of being lost.
+        """
         if not documents:
             return 0
-        self.vector_store.add_documents(documents)
+        self.vector_store.add_documents(documents, batch_size=batch_size)
         return len(documents)
     
+    def search_batch(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """Run several similarity searches in a single request."""
+        if not queries:
+            return []
+        # all-MiniLM uses no query prefix, so queries can be embedded as one batch
+        vectors = self.embeddings.embed_documents(queries)
+        responses = self.client.query_batch_points(
+            collection_name=COLLECTION_NAME,
+            requests=[
+                QueryRequest(query=vector, limit=k, with_payload=True, params=self.search_params())
+                for vector in vectors
+            ]
+        )
+        content_key = self.vector_store.content_payload_key
+        metadata_key = self.vector_store.metadata_payload_key
+        return [
+            [
+                Document(
+                    page_content=point.payload.get(content_key, ""),
+                    metadata=point.payload.get(metadata_key) or {}
+                )
+                for point in response.points
+            ]
+            for response in responses
+        ]
+    
+    def search_params(self) -> SearchParams:
+        """Search parameters for the active ANN profile (quantized search + rescoring)."""
+        return SearchParams(
+            hnsw_ef=self.profile["hnsw_ef"],
+            quantization=QuantizationSearchParams(
+                rescore=True,
+                oversampling=self.profile["oversampling"]
+            )
+        )
+    
     def get_retriever(self):
         """Get the retriever object."""
-        return self.vector_store.as_retriever()
+        return self.vector_store.as_retriever(search_kwargs={"search_params": self.search_params()})
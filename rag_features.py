@@ -1,22 +1,64 @@
 import re
-from typing import List, Tuple, Any
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Any, Iterator
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from config import GROQ_API_KEY, GROQ_MODEL
+from config import GROQ_API_KEY, GROQ_MODEL, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
 from neo4j_connect import GraphRAG
 from qdrant_connect import QdrantConnector
 from document_utils import load_document, split_into_chunks
+from langchain_core.documents import Document
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+def _normalize_query(query: str) -> str:
+    return query.strip().lower()
 
 class HybridRetriever:
     """Core RAG logic with routing and knowledge graph."""
     
-    def __init__(self, use_neo4j: bool = True):
+    def __init__(self, use_neo4j: bool = True, warmup: bool = True):
         """
         Initialize the hybrid retriever.
         
         Args:
             use_neo4j: Enable Neo4J knowledge graph (default: True)
+            warmup: Pre-establish the LLM connection and load the embedder (default: True)
         """
         self.use_neo4j = use_neo4j
         
@@ -33,6 +75,13 @@ class HybridRetriever:
         self.qdrant = QdrantConnector()
         self.retriever = self.qdrant.get_retriever()
         
+        # Shared pool so Qdrant and Neo4j lookups of one query run side by side
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        
+        # Caches for repeated questions; cleared whenever new content is ingested
+        self._retrieve_cache = _TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self._answer_cache = _TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        
         # Always try to initialize GraphRAG when use_neo4j is True
         self.graph_rag = None
         if self.use_neo4j:
@@ -41,6 +90,9 @@ class HybridRetriever:
                 print("✅ Neo4J GraphRAG enabled - entities will be extracted automatically")
             else:
                 print("⚠️ Neo4J not connected - graph features disabled")
+        
+        if warmup:
+            self.warmup()
 
         # Routing patterns
         self.patterns = {
@@ -53,6 +105,11 @@ class HybridRetriever:
                 r'historique', r'lien', r'impact'
             ]
         }
+        # One pre-compiled alternation per route, checked in the same order
+        self._compiled_patterns = {
+            method: re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+            for method, patterns in self.patterns.items()
+        }
         
         # Contextualization prompt for conversational memory
         self.contextualize_prompt = ChatPromptTemplate.from_messages([
@@ -84,6 +141,16 @@ Current question: {question}
 Reformulated question:""")
         ])
 
+    def warmup(self):
+        """Pay the first-request costs (LLM connection, embedder init) at startup."""
+        start = time.perf_counter()
+        try:
+            self.llm.bind(max_tokens=1).invoke("ping")
+        except Exception as e:
+            print(f"⚠️ LLM warmup failed: {e}")
+        self.qdrant.warmup()
+        print(f"🔥 Warmup done in {time.perf_counter() - start:.2f}s")
+
     def contextualize_query(self, query: str, chat_history: List[dict] = None) -> str:
         """
         Reformulate a query to be self-contained using conversation history.
@@ -146,42 +213,109 @@ Reformulated question:""")
 
     def route_query(self, query: str) -> str:
         """Determine which retrieval method to use."""
-        query_lower = query.lower()
-        
-        for method, patterns in self.patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, query_lower):
-                    return method
+        for method, pattern in self._compiled_patterns.items():
+            if pattern.search(query):
+                return method
                     
         return 'hybrid'
 
-    def retrieve(self, query: str) -> Tuple[List[Any], str, dict]:
-        """Retrieve context based on routing."""
-        import time
+    def _vector_search(self, query: str) -> Tuple[List[Any], float]:
+        """Run the Qdrant search and time it."""
+        start = time.perf_counter()
+        docs = self.retriever.invoke(query)
+        return docs, time.perf_counter() - start
+
+    def _graph_search(self, query: str) -> Tuple[List[Any], float]:
+        """Run the Neo4j search and time it; the text context is wrapped as a chunk."""
+        start = time.perf_counter()
+        docs = []
+        graph_context = self.graph_rag.query_graph(query)
+        if graph_context:
+            docs.append(Document(page_content=f"Generic Graph Context: {graph_context}", metadata={"source": "neo4j"}))
+        return docs, time.perf_counter() - start
+
+    def _plan_retrieval(self, query: str) -> Tuple[str, bool, bool]:
+        """Return the route and whether vector and graph search apply to it."""
         route = self.route_query(query)
+        use_vector = route in ['qdrant', 'hybrid']
+        use_graph = (
+            route in ['neo4j', 'hybrid']
+            and self.use_neo4j
+            and self.graph_rag is not None
+            and self.graph_rag.is_available()
+        )
+        return route, use_vector, use_graph
+
+    def retrieve(self, query: str) -> Tuple[List[Any], str, dict]:
+        """Retrieve context based on routing. Vector and graph searches run concurrently.
+
+        Timings are empty when the result comes from the cache.
+        """
+        cache_key = _normalize_query(query)
+        cached = self._retrieve_cache.get(cache_key)
+        if cached is not None:
+            chunks, route = cached
+            # Nothing was measured, so no timings are reported
+            return list(chunks), route, {}
+        
+        route, use_vector, use_graph = self._plan_retrieval(query)
         chunks = []
         timings = {"qdrant": 0.0, "neo4j": 0.0}
         
-        if route in ['qdrant', 'hybrid']:
-            # Vector search
-            start = time.time()
-            chunks.extend(self.retriever.invoke(query))
-            timings["qdrant"] = time.time() - start
-            
-        if route in ['neo4j', 'hybrid'] and self.use_neo4j and self.graph_rag and self.graph_rag.is_available():
-            # Graph search (returning as text/string for now, wrapped in list for consistency)
-            start = time.time()
-            graph_context = self.graph_rag.query_graph(query)
-            if graph_context:
-                # We wrap it in a mock object or string to treat as a chunk
-                from langchain_core.documents import Document
-                chunks.append(Document(page_content=f"Generic Graph Context: {graph_context}", metadata={"source": "neo4j"}))
-            timings["neo4j"] = time.time() - start
+        vector_future = self.executor.submit(self._vector_search, query) if use_vector else None
+        graph_future = self.executor.submit(self._graph_search, query) if use_graph else None
+        
+        if vector_future:
+            docs, timings["qdrant"] = vector_future.result()
+            chunks.extend(docs)
+        if graph_future:
+            docs, timings["neo4j"] = graph_future.result()
+            chunks.extend(docs)
 
+        self._retrieve_cache.set(cache_key, (list(chunks), route))
         return chunks, route, timings
 
-    def generate_answer(self, query: str, context_chunks: List[Any], route: str) -> str:
-        """Generate answer from context."""
+    async def retrieve_async(self, query: str) -> Tuple[List[Any], str, dict]:
+        """Async variant of `retrieve` for event-loop based front-ends."""
+        cache_key = _normalize_query(query)
+        cached = self._retrieve_cache.get(cache_key)
+        if cached is not None:
+            chunks, route = cached
+            # Nothing was measured, so no timings are reported
+            return list(chunks), route, {}
+        
+        route, use_vector, use_graph = self._plan_retrieval(query)
+        chunks = []
+        timings = {"qdrant": 0.0, "neo4j": 0.0}
+        
+        tasks = {}
+        if use_vector:
+            tasks["qdrant"] = asyncio.to_thread(self._vector_search, query)
+        if use_graph:
+            tasks["neo4j"] = asyncio.to_thread(self._graph_search, query)
+        
+        results = await asyncio.gather(*tasks.values())
+        for source, (docs, elapsed) in zip(tasks, results):
+            timings[source] = elapsed
+            chunks.extend(docs)
+
+        self._retrieve_cache.set(cache_key, (list(chunks), route))
+        return chunks, route, timings
+
+    def clear_caches(self):
+        """Drop cached retrievals and answers (called after ingestion)."""
+        self._retrieve_cache.clear()
+        self._answer_cache.clear()
+
+    def _answer_cache_key(self, query: str, context_chunks: List[Any], route: str) -> tuple:
+        return (
+            _normalize_query(query),
+            tuple(sorted(doc.page_content[:64] for doc in context_chunks)),
+            route
+        )
+
+    def _answer_chain(self, query: str, context_chunks: List[Any], route: str):
+        """Build the answer chain and its inputs for the given context."""
         context_text = "\n\n".join([doc.page_content for doc in context_chunks])
         
         if not context_text:
@@ -199,17 +333,49 @@ Reformulated question:""")
         ])
         
         chain = prompt | self.llm | StrOutputParser()
-        return chain.invoke({"input": query, "context": context_text})
+        return chain, {"input": query, "context": context_text}
+
+    def generate_answer(self, query: str, context_chunks: List[Any], route: str) -> str:
+        """Generate answer from context."""
+        cache_key = self._answer_cache_key(query, context_chunks, route)
+        cached = self._answer_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        chain, inputs = self._answer_chain(query, context_chunks, route)
+        answer = chain.invoke(inputs)
+        if answer:
+            self._answer_cache.set(cache_key, answer)
+        return answer
+
+    def generate_answer_stream(self, query: str, context_chunks: List[Any], route: str) -> Iterator[str]:
+        """Generate answer from context, yielding text pieces as the LLM produces them."""
+        cache_key = self._answer_cache_key(query, context_chunks, route)
+        cached = self._answer_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        
+        chain, inputs = self._answer_chain(query, context_chunks, route)
+        parts = []
+        for piece in chain.stream(inputs):
+            parts.append(piece)
+            yield piece
+        
+        answer = "".join(parts)
+        if answer:
+            self._answer_cache.set(cache_key, answer)
 
     def ingest(self, file_paths: List[str]) -> dict:
         """Ingest documents into enabled stores."""
         print(f"📥 Starting ingestion for {len(file_paths)} file(s): {file_paths}")
         
+        # Parse files in parallel; map() keeps the original file order
         docs = []
-        for path in file_paths:
-            loaded = load_document(path)
-            print(f"  → Loaded {len(loaded)} document(s) from {path}")
-            docs.extend(loaded)
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(file_paths)))) as pool:
+            for path, loaded in zip(file_paths, pool.map(load_document, file_paths)):
+                print(f"  → Loaded {len(loaded)} document(s) from {path}")
+                docs.extend(loaded)
         
         print(f"📚 Total documents loaded: {len(docs)}")
         
@@ -241,7 +407,8 @@ Reformulated question:""")
                 "graph_entities": stats["entities"],
                 "graph_relations": stats["relations"]
             })
-            
+        
+        self.clear_caches()
         return result
 
     def ingest_web(
@@ -317,6 +484,7 @@ Reformulated question:""")
                 })
                 print(f"✅ Created {stats['entities']} entities and {stats['relations']} relations")
             
+            self.clear_caches()
             return result
             
         except Exception as e:
@@ -22,5 +22,69 @@ class TestModules(unittest.TestCase):
         self.assertIsNotNone(config.COLLECTION_NAME)
         print(f"✅ Config loaded. Collection: {config.COLLECTION_NAME}")
 
+    def test_ttl_cache(self):
+        """Test query cache expiry and LRU eviction."""
+        import time
+        from rag_features import _TTLCache
+        cache = _TTLCache(maxsize=2, ttl=0.05)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "a" is now most recently used
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("c"))
+
+    def test_metrics_agg(self):
+        """Test that untimed (cached) rows count toward latency but not store averages."""
+        from metrics_log import empty_metrics_agg, update_metrics_agg
+        agg = update_metrics_agg(empty_metrics_agg(), [
+            ["2026-01-02T10:00:00", "1.5", "vector", "10", "100", "0.2", "0.3"],
+            ["2026-01-01T09:00:00", "0.5", "vector", "12", "80", "", ""],
+            ["2026-01-03T11:00:00", "2.0", "hybrid", "8", "120", "0.4", ""],
+        ])
+        self.assertEqual(agg["n"], 3)
+        self.assertEqual(agg["n_timed"], 2)
+        self.assertAlmostEqual(agg["sum_latency"], 4.0)
+        self.assertAlmostEqual(agg["sum_qdrant"], 0.6)
+        self.assertAlmostEqual(agg["sum_neo4j"], 0.3)
+        self.assertEqual(agg["route_counts"], {"vector": 2, "hybrid": 1})
+        self.assertAlmostEqual(agg["route_sum_latency"]["vector"], 2.0)
+        self.assertEqual(agg["t_min"], "2026-01-01T09:00:00")
+        self.assertEqual(agg["t_max"], "2026-01-03T11:00:00")
+        # Malformed rows are rejected before any total is touched
+        with self.assertRaises(ValueError):
+            update_metrics_agg(agg, [["not-a-date", "1.0", "vector", "1", "1", "", ""]])
+        self.assertEqual(agg["n"], 3)
+
+    def test_graph_batches(self):
+        """Test that graph batches respect the size cap and never repeat text."""
+        from langchain_core.documents import Document
+        from neo4j_connect import _graph_batches
+        words = [f"w{i}" for i in range(3000)]
+        docs = [
+            Document(page_content=" ".join(words[:2000]), metadata={"source": "a.pdf"}),
+            Document(page_content=" ".join(words[2000:2500]), metadata={"source": "a.pdf"}),
+            Document(page_content=" ".join(words[2500:]), metadata={"source": "b.pdf"}),
+        ]
+        batches = _graph_batches(docs, max_chars=1000)
+        self.assertTrue(all(len(b.page_content) <= 1000 for b in batches))
+        self.assertEqual([w for b in batches for w in b.page_content.split()], words)
+        # Pieces never mix sources
+        b_words = set(words[2500:])
+        for b in batches:
+            in_b = {w in b_words for w in b.page_content.split()}
+            self.assertEqual(in_b, {b.metadata["source"] == "b.pdf"})
+
+    def test_extract_keywords(self):
+        """Test keyword extraction drops stop words, dedups and caps at 10."""
+        from neo4j_connect import _extract_keywords_impl
+        self.assertEqual(_extract_keywords_impl("What is the Solar solar farm in Texas?"),
+                         ("solar", "farm", "texas"))
+        self.assertEqual(len(_extract_keywords_impl(" ".join(f"word{i}" for i in range(20)))), 10)
+
 if __name__ == '__main__':
     unittest.main()